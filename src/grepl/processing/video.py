@@ -1,27 +1,205 @@
+import math
+import os
+import sqlite3
 import subprocess
-import io
+from fractions import Fraction
+from functools import lru_cache
 from PIL import Image
 
-def get_frame_from_timestamp(video_path, timestamp) -> Image:
+PIPE_BUFSIZE = 1 << 20 # 1 MB, vs the 8 KB default
+SEEK_MARGIN_SEC = 2 # coarse input-side seek lands this far before the target
+
+class VideoKeyframeDbSqlite:
+    """
+    Keyframe timestamps per video, probed once and kept in SQLite so later seeks can
+    start straight from the nearest keyframe.
+    """
+
+    def __init__(self, db_path: str = "outlierdb.sqlite"):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.create_table()
+
+    def create_table(self):
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS video_keyframes (
+                    video_path    TEXT,
+                    pts           REAL  -- seconds. A single NULL row: probed, but no keyframes found
+                )
+                """
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_video_keyframes ON video_keyframes(video_path, pts)"
+            )
+
+    def ensure_keyframes(self, video_path) -> None:
+        """Probe and store the keyframes of video_path, unless we already have them."""
+        video_path = os.path.abspath(video_path)
+        if self.conn.execute(
+            "SELECT 1 FROM video_keyframes WHERE video_path = ? LIMIT 1", (video_path,)
+        ).fetchone():
+            return
+        # a NULL marker if there are none, so we don't probe the whole file again next time
+        keyframes = _probe_keyframes(video_path) or [None]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO video_keyframes (video_path, pts) VALUES (?, ?)",
+                [(video_path, pts) for pts in keyframes],
+            )
+
+    def nearest_keyframe(self, video_path, timestamp) -> float:
+        """Timestamp of the last keyframe at or before timestamp (0 if there is none)."""
+        self.ensure_keyframes(video_path)
+        (pts,) = self.conn.execute(
+            "SELECT max(pts) FROM video_keyframes WHERE video_path = ? AND pts <= ?",
+            (os.path.abspath(video_path), timestamp),
+        ).fetchone()
+        return pts if pts is not None else 0
+
+def _probe_keyframes(video_path) -> list[float]:
+    """
+    Get the timestamps of every keyframe in the first video stream via ffprobe. Only
+    keyframes are decoded, but this still reads the whole file - see VideoKeyframeDbSqlite.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-skip_frame", "nokey",
+        "-show_frames",
+        "-show_entries", "frame=pts_time",
+        "-of", "csv=p=0",
+        video_path
+    ]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    except subprocess.CalledProcessError:
+        raise ValueError(f"Failed to probe keyframes of {video_path} via ffprobe")
+    lines = proc.stdout.decode().split()
+    return [float(line.strip(",")) for line in lines if line.strip(",") not in ("", "N/A")]
+
+def get_frame_from_timestamp(video_path, timestamp, keyframe_db: VideoKeyframeDbSqlite | None = None) -> Image:
     """
     Get a frame from a video at a given timestamp and return it as a PIL Image.
+
+    If keyframe_db is given, the coarse seek starts from the nearest preceding keyframe
+    rather than a fixed margin before the timestamp.
     """
-    # Use ffmpeg pipe to extract a single frame (supports AV1)
+    width, height, _ = _probe_video_stream(video_path)
+    # Fast + accurate seek: jump to a keyframe shortly before the timestamp (input-side
+    # -ss), then decode only the remaining gap (output-side -ss)
+    if keyframe_db is not None:
+        coarse_ts = keyframe_db.nearest_keyframe(video_path, timestamp)
+    else:
+        coarse_ts = max(0, timestamp - SEEK_MARGIN_SEC)
+    fine_ts = timestamp - coarse_ts
+    # Use ffmpeg pipe to extract a single frame (supports AV1). Raw RGB rather than
+    # PNG, so we skip the PNG encode in ffmpeg and the decode in PIL
     cmd = [
         "ffmpeg",
-        "-ss", str(timestamp),
+        "-ss", str(coarse_ts),
+        # frames as stored, so they match _probe_video_stream's width/height even when
+        # the stream has a rotation (display matrix) that ffmpeg would otherwise apply
+        "-noautorotate",
         "-i", video_path,
+        "-ss", str(fine_ts),
         "-frames:v", "1",
-        "-f", "image2pipe",
-        "-vcodec", "png",
+        "-f", "rawvideo",
+        "-pix_fmt", "rgb24",
         "-"
     ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=PIPE_BUFSIZE)
+    with proc:
+        frames = _read_rgb_frames(proc.stdout, width, height, 1)
+    if proc.returncode != 0 or len(frames) != 1:
+        raise ValueError(f"Failed to extract frame at {timestamp}s via ffmpeg")
+    return frames[0]
+
+@lru_cache(maxsize=None)
+def _probe_video_stream(video_path) -> tuple[int, int, float]:
+    """
+    Get the (width, height, frame rate) of the first video stream via ffprobe. width and
+    height are the coded size, ignoring any rotation - hence ffmpeg -noautorotate.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,r_frame_rate",
+        "-of", "csv=p=0",
+        video_path
+    ]
     try:
         proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
-        img = Image.open(io.BytesIO(proc.stdout))
-        return img.convert("RGB")
-    except subprocess.CalledProcessError:
-        raise ValueError(f"Failed to extract frame at {timestamp}s via ffmpeg")
+        width, height, frame_rate = proc.stdout.decode().strip().split(",")
+        return int(width), int(height), float(Fraction(frame_rate))
+    except (subprocess.CalledProcessError, ValueError, ZeroDivisionError):
+        raise ValueError(f"Failed to probe video stream of {video_path} via ffprobe")
+
+def _read_rgb_frames(stdout, width, height, n_frames) -> list[Image]:
+    """
+    Read up to n_frames rgb24 frames from an ffmpeg rawvideo pipe. Stops early at EOF.
+    """
+    frame_size = width * height * 3
+    frames = []
+    for _ in range(n_frames):
+        buf = bytearray(frame_size)
+        if stdout.readinto(memoryview(buf)) != frame_size:
+            break
+        frames.append(Image.frombuffer("RGB", (width, height), buf, "raw", "RGB", 0, 1))
+    return frames
+
+def get_frames_from_timestamps(video_path, timestamps, keyframe_db: VideoKeyframeDbSqlite | None = None) -> list[Image]:
+    """
+    Get frames from a video at several timestamps and return them as PIL Images, in
+    the same order as timestamps.
+
+    Unlike calling get_frame_from_timestamp in a loop, this runs a single ffmpeg process:
+    it seeks once to just before the earliest timestamp, then a select filter picks out the frame
+    numbers we want, so the container open + decoder startup is only paid once.
+
+    keyframe_db works as in get_frame_from_timestamp.
+    """
+    if not timestamps:
+        return []
+    width, height, fps = _probe_video_stream(video_path)
+    # coarse input-side seek, like get_frame_from_timestamp; the select filter below
+    # does the frame-accurate part
+    if keyframe_db is not None:
+        start = keyframe_db.nearest_keyframe(video_path, min(timestamps))
+    else:
+        start = max(0, min(timestamps) - SEEK_MARGIN_SEC)
+    # frame numbers restart at 0 after the input-side seek. Like seeking, take the
+    # first frame at or after each timestamp
+    frame_idxs = [math.ceil((timestamp - start) * fps - 1e-6) for timestamp in timestamps]
+    unique_frame_idxs = sorted(set(frame_idxs))
+    select_expr = "+".join(f"eq(n,{idx})" for idx in unique_frame_idxs)
+    cmd = [
+        "ffmpeg",
+        "-ss", str(start),
+        "-noautorotate", # see get_frame_from_timestamp
+        "-i", video_path,
+        "-vf", f"select='{select_expr}'",
+        "-vsync", "vfr",
+        "-frames:v", str(len(unique_frame_idxs)),
+        "-f", "rawvideo",
+        "-pix_fmt", "rgb24",
+        "-"
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=PIPE_BUFSIZE)
+    with proc:
+        decoded = _read_rgb_frames(proc.stdout, width, height, len(unique_frame_idxs))
+    if proc.returncode != 0:
+        raise ValueError(f"Failed to extract frames at {timestamps}s via ffmpeg")
+    if len(decoded) != len(unique_frame_idxs):
+        raise ValueError(
+            f"Expected {len(unique_frame_idxs)} frames from ffmpeg but got {len(decoded)} "
+            f"(timestamps past the end of {video_path}?)"
+        )
+    frames = dict(zip(unique_frame_idxs, decoded))
+    return [frames[idx] for idx in frame_idxs]
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+"""
+zstd compression for the raw_page HTML written by scrape_outlier and read back by
+parse_outlier. Scraped pages are hundreds of KB of repetitive DOM, so they compress
+~10-20x - and several times better again with a dictionary trained on earlier pages
+from the same site, since the boilerplate (class strings, script tags) is then just a
+reference into the dictionary.
+
+Dictionaries are stored in the zstd_dict table. Each compressed frame records the id
+of the dictionary it was written with (0 for none) in its header, so readers don't
+need a separate column to pick the right one.
+"""
+import sqlite3
+import zstandard as zstd
+
+ZSTD_LEVEL = 10
+DICT_SIZE = 128 * 1024 # bytes
+DICT_TRAIN_SAMPLES = 100 # pages to collect before training a dictionary
+
+# reused across calls - building a (de)compressor context isn't free
+_CCTX = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+_DCTX = zstd.ZstdDecompressor()
+_DICT_DCTXS: dict[int, zstd.ZstdDecompressor] = {} # dict_id -> decompressor, see load_dictionaries
+
+def train_dictionary(samples: list[str]) -> zstd.ZstdCompressionDict:
+    """Train a zstd dictionary on sample pages. Raises zstd.ZstdError if training fails."""
+    return zstd.train_dictionary(DICT_SIZE, [html.encode("utf-8") for html in samples])
+
+def dictionary_compressor(dict_data: zstd.ZstdCompressionDict | None) -> zstd.ZstdCompressor:
+    """A compressor for compress_html using dict_data, or the plain one if it's None."""
+    if dict_data is None:
+        return _CCTX
+    return zstd.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data)
+
+def compress_html(html: str, cctx: zstd.ZstdCompressor = _CCTX) -> bytes:
+    """Compress a page's HTML for the raw_page content column."""
+    return cctx.compress(html.encode("utf-8"))
+
+def read_dictionaries(conn: sqlite3.Connection) -> list[tuple[int, bytes]]:
+    """All (dict_id, dict_data) rows of the zstd_dict table, if there is one."""
+    try:
+        return conn.execute("SELECT dict_id, dict_data FROM zstd_dict").fetchall()
+    except sqlite3.OperationalError: # no such table - written before dictionaries
+        return []
+
+def load_dictionaries(dict_rows: list[tuple[int, bytes]]) -> None:
+    """Make the dictionaries in dict_rows (see read_dictionaries) available to decompress_html."""
+    for dict_id, dict_data in dict_rows:
+        _DICT_DCTXS[dict_id] = zstd.ZstdDecompressor(dict_data=zstd.ZstdCompressionDict(dict_data))
+
+def decompress_html(content: bytes | str) -> str:
+    """
+    Inverse of compress_html. Rows written before content was compressed are plain
+    TEXT, and are returned unchanged. Frames written with a dictionary need it loaded
+    via load_dictionaries first.
+    """
+    if isinstance(content, str):
+        return content
+    dict_id = zstd.get_frame_parameters(content).dict_id
+    if dict_id and dict_id not in _DICT_DCTXS:
+        raise ValueError(f"Content was compressed with zstd dictionary {dict_id}, which isn't loaded")
+    dctx = _DICT_DCTXS[dict_id] if dict_id else _DCTX
+    return dctx.decompress(content).decode("utf-8")
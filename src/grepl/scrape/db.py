@@ -0,0 +1,44 @@
+"""
+SQLite settings shared by the scraper and the parsers, which all work on the same
+outlierdb.sqlite file - often at the same time, e.g. parsing while a scrape is running.
+"""
+import contextlib
+import sqlite3
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # readers don't block on the writer
+    "PRAGMA synchronous=NORMAL",    # no fsync per commit (still safe with WAL)
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-200000",    # ~200 MB page cache
+    "PRAGMA mmap_size=268435456",   # 256 MB
+    "PRAGMA busy_timeout=5000",     # ms
+)
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """An autocommit connection with SQLITE_PRAGMAS applied."""
+    # isolation_level=None puts sqlite3 in autocommit mode, so transactions are only
+    # the explicit ones opened by SqliteDb.transaction()
+    conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class SqliteDb:
+    """Base for the parsers: a connection to db_path and explicit transactions on it."""
+
+    def __init__(self, db_path: str = "outlierdb.sqlite"):
+        # one connection per instance, plus any short-lived read connections (see
+        # ParsedOutlierDbSqlite.parse_all)
+        self.db_path = db_path
+        self.conn = connect(db_path)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT around the block, rolling back if it raises."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
@@ -1,20 +1,42 @@
 """
 TODO items:
 * can we refactor this into another dataclass?
-* don't like this extra for loop in parse_all
 * get rid of url, page_idx, scroll_idx? maybe just snapshot_ts
 * If I get multiple youtube_ids in a block, i want to crash. is that actually working here?
 """
 
 import bs4
-import sqlite3
+import contextlib
+import html
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from grepl.scrape.compression import decompress_html, load_dictionaries, read_dictionaries
+from grepl.scrape.db import SqliteDb, connect
 from tqdm import tqdm
 
-class ParsedOutlierDbSqlite:
-    conn = sqlite3.connect("outlierdb.sqlite")
-
-    def __init__(self):
+INSERT_BATCH_SIZE = 10_000 # rows buffered before each executemany, one transaction each
+FETCH_SIZE = 1000 # raw_page rows fetched per fetchmany
+PARSE_CHUNKSIZE = 32 # raw_page rows sent to a worker process at a time
+SEQUENCE_CARD_CLASS = 'flex justify-center sequence-card'
+# only build the parts of the tree we actually extract from. Note the strainer
+# matches the raw class attribute, so it needs the full class string
+SEQUENCE_CARD_STRAINER = bs4.SoupStrainer('div', class_=SEQUENCE_CARD_CLASS)
+DESCRIPTION_CLASS = 'text-neutral-900 dark:text-neutral-100 my-4 p-2'
+
+# regex fast path for the fixed-schema sequence cards, see _extract_data_from_html_fast
+_CARD_START_RE = re.compile(r'<div class="' + re.escape(SEQUENCE_CARD_CLASS) + '"')
+_DIV_TAG_RE = re.compile(r'<(/?)div\b')
+_YT_IFRAME_RE = re.compile(r'youtube-nocookie\.com/embed/([a-zA-Z0-9_-]+)')
+_YT_THUMB_RE = re.compile(r'img\.youtube\.com/vi/([a-zA-Z0-9_-]+)/hqdefault\.jpg')
+_DESCRIPTION_RE = re.compile(r'<p class="' + re.escape(DESCRIPTION_CLASS) + r'">([^<]*)</p>')
+_TAG_RE = re.compile(r'<span[^>]*>\s*(#[^<]*?)\s*</span>')
+
+class ParsedOutlierDbSqlite(SqliteDb):
+    insert_sql = "INSERT OR IGNORE INTO parsed_page (url, page_idx, scroll_idx, snapshot_ts, tags, youtube_id, caption) VALUES (?,?,?,?,?,?,?)"
+
+    def __init__(self, db_path: str = "outlierdb.sqlite"):
+        super().__init__(db_path)
         self.drop_table()
         self.create_table()
 
@@ -36,27 +58,23 @@ class ParsedOutlierDbSqlite:
             str: The YouTube video ID if found, otherwise an empty string.
 
         """
-        youtube_ids = set()
-
-        # Find all <iframe> tags with YouTube URLs
-        for iframe in block.find_all('iframe'):
-            src = iframe.get('src', '')
-            match = re.search(r'youtube-nocookie\.com/embed/([a-zA-Z0-9_-]+)', src)
-            if match:
-                youtube_ids.add(match.group(1))
-
-        # Find all <img> tags with YouTube thumbnail URLs
-        for img in block.find_all('img'):
-            src = img.get('src', '')
-            match = re.search(r'img\.youtube\.com/vi/([a-zA-Z0-9_-]+)/hqdefault\.jpg', src)
-            if match:
-                youtube_ids.add(match.group(1))
-
-        if len(youtube_ids) == 1:
-            return youtube_ids.pop()
-        elif len(youtube_ids) > 1:
-            raise ValueError(f"Multiple YouTube IDs found in block: {youtube_ids}")
-        return ''
+        # single walk over the block for both <iframe> embeds and <img> thumbnails,
+        # bailing out as soon as a second distinct id shows up
+        found_id = ''
+        for tag in block.descendants:
+            if tag.name == 'iframe':
+                match = _YT_IFRAME_RE.search(tag.get('src', ''))
+            elif tag.name == 'img':
+                match = _YT_THUMB_RE.search(tag.get('src', ''))
+            else:
+                continue
+            if not match:
+                continue
+            youtube_id = match.group(1)
+            if found_id and youtube_id != found_id:
+                raise ValueError(f"Multiple YouTube IDs found in block: {{{found_id!r}, {youtube_id!r}}}")
+            found_id = youtube_id
+        return found_id
 
     @staticmethod
     def _extract_description_from_block(block: bs4.element.Tag) -> str:
@@ -71,7 +89,7 @@ class ParsedOutlierDbSqlite:
         """
         # example block:
         # <p class="text-neutral-900 dark:text-neutral-100 my-4 p-2">00:34 - A single leg takedown.</p>
-        video_description = block.find('p', class_='text-neutral-900 dark:text-neutral-100 my-4 p-2')
+        video_description = block.find('p', class_=DESCRIPTION_CLASS)
         if not video_description:
             raise ValueError("No video description found in block")
         return video_description.text.strip()
@@ -90,13 +108,8 @@ class ParsedOutlierDbSqlite:
         # example content:
         # <span class="py-2 px-3 border border-neutral-400 dark:border-neutral-500 cursor-pointer  
         # bg-gray-200 dark:bg-neutral-600 text-gray-800 dark:text-gray-200 text-xs rounded-md hover:bg-gray-300 dark:hover:bg-neutral-500 hover:text-neutral-900 dark:hover:text-neutral-100 hover:dark:border-neutral-300">#wrestling</span><span class="py-2 px-3 border border-neutral-400 dark:border-neutral-500 cursor-pointer  bg-gray-200 dark:bg-neutral-600 text-gray-800 dark:text-gray-200 text-xs rounded-md hover:bg-gray-300 dark:hover:bg-neutral-500 hover:text-neutral-900 dark:hover:text-neutral-100 hover:dark:border-neutral-300">#takedown</span><span class="py-2 px-3 border border-neutral-400 dark:border-neutral-500 cursor-pointer  bg-gray-200 dark:bg-neutral-600 text-gray-800 dark:text-gray-200 text-xs rounded-md hover:bg-gray-300 dark:hover:bg-neutral-500 hover:text-neutral-900 dark:hover:text-neutral-100 hover:dark:border-neutral-300">#standing</span><span class="py-2 px-3 border border-neutral-400 dark:border-neutral-500 cursor-pointer  bg-gray-200 dark:bg-neutral-600 text-gray-800 dark:text-gray-200 text-xs rounded-md hover:bg-gray-300 dark:hover:bg-neutral-500 hover:text-neutral-900 dark:hover:text-neutral-100 hover:dark:border-neutral-300">#singleleg</span><span class="py-2 px-3 border border-neutral-400 dark:border-neutral-500 cursor-pointer  bg-gray-200 dark:bg-neutral-600 text-gray-800 dark:text-gray-200 text-xs rounded-md hover:bg-gray-300 dark:hover:bg-neutral-500 hover:text-neutral-900 dark:hover:text-neutral-100 hover:dark:border-neutral-300">#singlelegtakedown</span><span class="py-2 px-3 border border-neutral-400 dark:border-neutral-500 cursor-pointer  bg-gray-200 dark:bg-neutral-600 text-gray-800 dark:text-gray-200 text-xs rounded-md hover:bg-gray-300 dark:hover:bg-neutral-500 hover:text-neutral-900 dark:hover:text-neutral-100 hover:dark:border-neutral-300">#footage</span>
-        tags = []
-        for span in block.find_all('span'):
-            tag = span.text.strip()
-            if tag and tag.startswith('#'):
-                # Ensure the tag is unique and not empty
-                tags.append(tag)
-        return tags
+        # one regex scan over the block's markup, rather than building .text for every span
+        return [html.unescape(tag) for tag in _TAG_RE.findall(block.decode_contents())]
 
     @staticmethod
     def _extract_data_from_block(block: bs4.element.Tag) -> dict:
@@ -124,10 +137,53 @@ class ParsedOutlierDbSqlite:
             'tags': tags,
         }
 
+    @staticmethod
+    def _extract_data_from_html_fast(html_content: str) -> list[dict] | None:
+        """
+        Regex-only version of extract_data_from_html, for the usual case where the
+        sequence cards look exactly like the examples in the docstrings above.
+
+        Each card is bounded by counting <div>/</div> tags from its opening tag (the
+        page source is serialised by the browser, so it is well formed).
+
+        Returns:
+            list[dict] | None: Same as extract_data_from_html, or None if any card doesn't
+            fit the expected shape - the caller should fall back to BeautifulSoup. That
+            includes cards whose opening tag the regex misses (other attributes, a
+            different class order), caught by counting "sequence-card" in the page.
+        """
+        card_starts = list(_CARD_START_RE.finditer(html_content))
+        if len(card_starts) != html_content.count('sequence-card'):
+            return None
+        data = []
+        for card_start in card_starts:
+            depth = 0
+            card_end = None
+            for div_tag in _DIV_TAG_RE.finditer(html_content, card_start.start()):
+                depth += -1 if div_tag.group(1) else 1
+                if depth == 0:
+                    card_end = div_tag.end()
+                    break
+            if card_end is None:
+                return None
+            card = html_content[card_start.start():card_end]
+
+            youtube_ids = set(_YT_IFRAME_RE.findall(card))
+            youtube_ids.update(_YT_THUMB_RE.findall(card))
+            descriptions = _DESCRIPTION_RE.findall(card)
+            if len(youtube_ids) > 1 or len(descriptions) != 1:
+                return None
+            data.append({
+                'youtube_id': youtube_ids.pop() if youtube_ids else '',
+                'caption': html.unescape(descriptions[0]).strip(),
+                'tags': [html.unescape(tag) for tag in _TAG_RE.findall(card)],
+            })
+        return data
+
     # ---- public api -----
 
     def create_table(self):
-        with self.conn:
+        with self.transaction():
             self.conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS parsed_page (
@@ -142,70 +198,84 @@ class ParsedOutlierDbSqlite:
                 )
                 """
             )
+            # covering index for VideoUrlParser's SELECT DISTINCT youtube_id, caption, tags
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_parsed_page_yt_cap_tags ON parsed_page(youtube_id, caption, tags)"
+            )
 
     def drop_table(self):
-        with self.conn:
+        with self.transaction():
             self.conn.execute("DROP TABLE IF EXISTS parsed_page")
 
 
     def save_parsed_page(self, url: str, page_idx: int, scroll_idx: int, tags: list[str], 
                         youtube_id: str, caption: str, snapshot_ts: str) -> None:
-        with self.conn:
-            self.conn.execute(
-                "INSERT OR IGNORE INTO parsed_page (url, page_idx, scroll_idx, snapshot_ts, tags, youtube_id, caption) VALUES (?,?,?,?,?,?,?)",
-                (url, page_idx, scroll_idx, snapshot_ts, ",".join(tags), youtube_id, caption),
-            )
+        """Insert a single parsed entry. Autocommits unless called inside self.transaction()."""
+        self.conn.execute(
+            self.insert_sql,
+            (url, page_idx, scroll_idx, snapshot_ts, ",".join(tags), youtube_id, caption),
+        )
+
+    def _insert_batch(self, rows_buffer: list[tuple]) -> None:
+        """Insert and clear rows_buffer in its own transaction."""
+        # one transaction per batch rather than per row (dominated by fsync) or per pass,
+        # which would hold the write lock long enough for the scraper to time out
+        with self.transaction():
+            self.conn.executemany(self.insert_sql, rows_buffer)
+        rows_buffer.clear()
 
     @classmethod
     def extract_data_from_html(cls, html_content: str) -> list[dict]:
-        """
-        Extracts relevant data from the provided HTML content.
-
-        The HTML content might contain multiple blocks of data, each containing:
-        * Video URL
-        * Video description (including a timestamp)
-        * Tags (eg #footage, #wrestling, #singleleg)
-
-        This function
-        * parses the HTML content into blocks
-        * extracts the aforementioned data per block
-        * returns a list of dictionaries with the extracted data
+        """See the module-level extract_data_from_html."""
+        return extract_data_from_html(html_content)
 
-        Args:
-            html_content (str): The HTML content to extract data from.
-
-        Returns:
-            list[dict]: A list of dictionaries, each containing the extracted data from a block.
+    def parse_all(self, min_snapshot_ts:str|None = None, n_workers: int|None = None):
         """
+        Parses and saves all pages in the raw_page table.
 
-        soup = bs4.BeautifulSoup(html_content, 'html.parser')
-        data = []
-
-        # Find all relevant blocks in the HTML content
-        for block in soup.find_all('div', class_='flex justify-center sequence-card'):
-            data.append(cls._extract_data_from_block(block))
-
-        return data
-
-    def parse_all(self, min_snapshot_ts:str|None = None):
-        """Parses and saves all pages in the raw_page table."""
+        HTML parsing is CPU bound and independent per row, so it is spread over
+        n_workers processes (default: os.cpu_count()). All SQLite I/O stays in this process.
+        """
         if min_snapshot_ts is None:
             min_snapshot_ts = '1900-01-01' # something absurdly low
-        n_rows_query = f"SELECT COUNT(*) FROM raw_page WHERE snapshot_ts >= {min_snapshot_ts}"
-        n_rows = self.conn.execute(n_rows_query).fetchone()[0]
-
-        all_rows_query = f"SELECT * FROM raw_page WHERE snapshot_ts >= {min_snapshot_ts}"
+        n_rows_query = "SELECT COUNT(*) FROM raw_page WHERE snapshot_ts >= ?"
+        n_rows = self.conn.execute(n_rows_query, (min_snapshot_ts,)).fetchone()[0]
+
+        raw_page_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(raw_page)")}
+        if "content_hash" in raw_page_columns:
+            # deduplicated pages live in content_blob; older rows still have content inline
+            all_rows_query = """
+                SELECT r.url, r.page_idx, r.scroll_idx, r.snapshot_ts, COALESCE(r.content, b.content)
+                FROM raw_page r LEFT JOIN content_blob b ON b.content_hash = r.content_hash
+                WHERE r.snapshot_ts >= ?
+            """
+        else:
+            all_rows_query = "SELECT url, page_idx, scroll_idx, snapshot_ts, content FROM raw_page WHERE snapshot_ts >= ?"
         
-        # final_data = []
-        for row in tqdm(self.conn.execute(all_rows_query), total=n_rows):
-            url, page_idx, scroll_idx, snapshot_ts, content = row
-            curr_data = ParsedOutlierDbSqlite.extract_data_from_html(content)
-            # TODO don't like this for loop... ugh
-            for entry in curr_data:
-                tags = entry["tags"]
-                youtube_id = entry["youtube_id"]
-                caption = entry["caption"]
-                self.save_parsed_page(url, page_idx, scroll_idx, tags, youtube_id, caption, snapshot_ts)
+        # the streaming SELECT gets its own connection: its read snapshot would otherwise
+        # stop self.conn from starting a write once the scraper has committed (SQLITE_BUSY)
+        read_conn = connect(self.db_path)
+        read_cur = read_conn.cursor()
+        read_cur.arraysize = FETCH_SIZE
+        rows_buffer = []
+        with contextlib.closing(read_conn), tqdm(total=n_rows) as progress, \
+                ProcessPoolExecutor(
+                    max_workers=n_workers or os.cpu_count(),
+                    initializer=load_dictionaries,
+                    initargs=(read_dictionaries(self.conn),),
+                ) as executor:
+            read_cur.execute(all_rows_query, (min_snapshot_ts,))
+            while rows := read_cur.fetchmany():
+                # parse the block in parallel, then zip the results back up with their rows
+                contents = [row[4] for row in rows]
+                parsed = executor.map(_extract_parsed_page_values, contents, chunksize=PARSE_CHUNKSIZE)
+                for (url, page_idx, scroll_idx, snapshot_ts, _), values in zip(rows, parsed):
+                    rows_buffer.extend((url, page_idx, scroll_idx, snapshot_ts, *entry) for entry in values)
+                if len(rows_buffer) >= INSERT_BATCH_SIZE:
+                    self._insert_batch(rows_buffer)
+                progress.update(len(rows))
+            if rows_buffer:
+                self._insert_batch(rows_buffer)
             # TODO
             # curr_data = pd.DataFrame(curr_data)
             # curr_data["url"] = url
@@ -213,8 +283,58 @@ class ParsedOutlierDbSqlite:
             # curr_data["scroll_idx"] = scroll_idx
             # curr_data["snapshot_ts"] = snapshot_ts
             # final_data.append(curr_data)
-            
-        
+
+
+def extract_data_from_html(html_content: str) -> list[dict]:
+    """
+    Extracts relevant data from the provided HTML content.
+
+    The HTML content might contain multiple blocks of data, each containing:
+    * Video URL
+    * Video description (including a timestamp)
+    * Tags (eg #footage, #wrestling, #singleleg)
+
+    This function
+    * parses the HTML content into blocks
+    * extracts the aforementioned data per block
+    * returns a list of dictionaries with the extracted data
+
+    This lives at module level (rather than on ParsedOutlierDbSqlite) so it can be
+    sent to ProcessPoolExecutor workers.
+
+    Args:
+        html_content (str): The HTML content to extract data from.
+
+    Returns:
+        list[dict]: A list of dictionaries, each containing the extracted data from a block.
+    """
+    data = ParsedOutlierDbSqlite._extract_data_from_html_fast(html_content)
+    if data is not None:
+        return data
+
+    soup = bs4.BeautifulSoup(html_content, 'lxml', parse_only=SEQUENCE_CARD_STRAINER)
+    data = []
+
+    # Find all relevant blocks in the HTML content
+    for block in soup.find_all('div', class_=SEQUENCE_CARD_CLASS):
+        data.append(ParsedOutlierDbSqlite._extract_data_from_block(block))
+
+    return data
+
+
+def _extract_parsed_page_values(content: bytes | str) -> list[tuple[str, str, str]]:
+    """
+    extract_data_from_html on a raw_page content value (decompressed here, in the
+    worker), flattened to (tags, youtube_id, caption) tuples in parsed_page column
+    order. Used by parse_all workers: tuples are cheaper to send back to the main
+    process than dicts, and are ready for executemany as-is.
+    """
+    return [
+        (",".join(entry["tags"]), entry["youtube_id"], entry["caption"])
+        for entry in extract_data_from_html(decompress_html(content))
+    ]
+
+
 if __name__ == "__main__":
     db = ParsedOutlierDbSqlite()
     # db.drop_table()
@@ -11,23 +11,67 @@ and a caption like this:
 
 Note: may have valid duplicate timestamped_urls (see youtube_id = 'xWkxJg8mB6w')
 """
-import sqlite3
 import re
-from tqdm import tqdm
+from grepl.scrape.db import SqliteDb
 
-class VideoUrlParser:
-    conn = sqlite3.connect("outlierdb.sqlite")
+ENRICH_BATCH_SIZE = 10_000 # parsed_page rows per transaction in VideoUrlParser.parse_all
+_TS_RE = re.compile(r'^(?:(\d{1,2}):)?(\d{1,2}):(\d{2})') # [HH:]MM:SS
+_YTID_RE = re.compile(r'[A-Za-z0-9_-]{11}') # use with fullmatch - $ would also match before a trailing newline
 
-    def __init__(self):
+def _caption_to_seconds(caption: str | None) -> int | None:
+    """Seconds from the timestamp at the start of a caption ('01:03 - ...'), or None."""
+    if caption is None or not (ts_match := _TS_RE.match(caption)):
+        return None
+    hours, minutes, seconds = ts_match.groups()
+    return (
+        (int(hours) if hours else 0) * 60 * 60 +
+        int(minutes) * 60 +
+        int(seconds)
+    )
+
+class VideoUrlParser(SqliteDb):
+    insert_sql = "INSERT INTO parsed_page_enriched (timestamped_url, total_seconds, youtube_id, caption, tags) VALUES (?, ?, ?, ?, ?)"
+    # parse_all one youtube_id range (after, upto] at a time - ts_seconds is _caption_to_seconds,
+    # registered in __init__. youtube_id > '' also skips the rows without one
+    batch_end_sql = """
+        SELECT max(youtube_id) FROM (
+            SELECT youtube_id FROM parsed_page WHERE youtube_id > ? ORDER BY youtube_id LIMIT ?
+        )
+    """
+    candidates_sql = """
+        SELECT youtube_id, caption, tags
+        FROM (
+            SELECT DISTINCT youtube_id, caption, tags FROM parsed_page
+            WHERE youtube_id > :after AND youtube_id <= :upto
+        )
+        WHERE caption != '' AND tags != ''
+    """
+    enrich_sql = f"""
+        INSERT INTO parsed_page_enriched (timestamped_url, total_seconds, youtube_id, caption, tags)
+        SELECT
+            'https://www.youtube.com/watch?v=' || youtube_id || '&t=' || total_seconds || 's',
+            total_seconds, youtube_id, caption, tags
+        FROM (
+            SELECT youtube_id, caption, tags, ts_seconds(caption) AS total_seconds
+            FROM ({candidates_sql})
+            -- same check as _YTID_RE, but native GLOB rather than a Python callback per row
+            WHERE length(youtube_id) = 11 AND youtube_id NOT GLOB '*[^A-Za-z0-9_-]*'
+        )
+        WHERE total_seconds IS NOT NULL
+    """
+
+    def __init__(self, db_path: str = "outlierdb.sqlite"):
+        super().__init__(db_path)
+        self.conn.create_function("ts_seconds", 1, _caption_to_seconds, deterministic=True)
         self.drop_table()
         self.create_table()
 
     def drop_table(self):
-        with self.conn:
+        with self.transaction():
             self.conn.execute("DROP TABLE IF EXISTS parsed_page_enriched")
 
     def create_table(self):
-        with self.conn:
+        with self.transaction():
             self.conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS parsed_page_enriched (
@@ -44,41 +88,43 @@ class VideoUrlParser:
     def parse_timestamp_from_caption(cls, youtube_id: str, caption: str) -> tuple[int, str]:
         """Return a Youtube URL with a timestamp (inferred from the caption) added."""
         # Confirm that youtube_id is valid
-        if youtube_id is None or len(youtube_id) != 11:
+        if youtube_id is None or not _YTID_RE.fullmatch(youtube_id):
             raise ValueError(f"youtube_id {youtube_id} appears to be invalid")
         # Extract timestamp from caption, e.g., '01:03' or '01:23:45'
-        # TODO later, try an optional hours group: ^(?:(\d{1,2}):)?(\d{1,2}):(\d{2})
-        total_seconds = None
-        if hour_ts_match := re.match(r'^(\d{1,2}):(\d{2}):(\d{2})', caption):
-            hours, minutes, seconds = hour_ts_match.groups()
-            total_seconds = (
-                int(hours) * 60 * 60 +
-                int(minutes) * 60 +
-                int(seconds)
-            )
-        elif ts_match := re.match(r'^(\d{1,2}):(\d{2})', caption):
-            minutes, seconds = ts_match.groups()
-            total_seconds = int(minutes) * 60 + int(seconds)
+        total_seconds = _caption_to_seconds(caption)
         if total_seconds is not None:
             return total_seconds, f'https://www.youtube.com/watch?v={youtube_id}&t={total_seconds}s'
         raise ValueError(f"Expected to extract a timestamp from {caption} for youtube_id {youtube_id}")
 
     def parse_all(self):
-        """Parses and saves all timestamped video URLs."""
-        n_rows = self.conn.execute("SELECT COUNT(*) FROM (SELECT DISTINCT youtube_id, caption, tags FROM parsed_page)").fetchone()[0]
-        for row in tqdm(self.conn.execute("SELECT DISTINCT youtube_id, caption, tags FROM parsed_page"), total=n_rows):
-            youtube_id, caption, tags = row
-            if youtube_id and caption and tags:
-                total_seconds, timestamped_url = self.parse_timestamp_from_caption(youtube_id, caption)
-                self.save_parsed_video_url(timestamped_url, total_seconds, youtube_id, caption, tags)
+        """
+        Parses and saves all timestamped video URLs.
+
+        Runs as an INSERT ... SELECT per ENRICH_BATCH_SIZE parsed_page rows, with the
+        caption timestamp parsed by the ts_seconds SQL function. Rows without a valid
+        youtube_id or caption timestamp are skipped (and counted) rather than raising
+        like parse_timestamp_from_caption.
+        """
+        n_rows = n_saved = 0
+        after = ''
+        # a transaction per batch, so the write lock is never held long enough for the
+        # scraper (busy_timeout 30 s) to give up. Batches end on a whole youtube_id, so
+        # the DISTINCT in candidates_sql still sees all of that video's rows at once
+        while (upto := self.conn.execute(self.batch_end_sql, (after, ENRICH_BATCH_SIZE)).fetchone()[0]) is not None:
+            batch = {"after": after, "upto": upto}
+            with self.transaction():
+                n_rows += self.conn.execute(f"SELECT COUNT(*) FROM ({self.candidates_sql})", batch).fetchone()[0]
+                n_saved += self.conn.execute(self.enrich_sql, batch).rowcount
+            after = upto
+        if n_saved < n_rows:
+            print(f"Skipped {n_rows - n_saved} of {n_rows} rows with an invalid youtube_id or no caption timestamp")
 
     def save_parsed_video_url(self, timestamped_url, total_seconds, youtube_id, caption, tags):
-        """Save parsed timestamped video URL to DB."""
-        with self.conn:
-            self.conn.execute(
-                "INSERT INTO parsed_page_enriched (timestamped_url, total_seconds, youtube_id, caption, tags) VALUES (?, ?, ?, ?, ?)",
-                (timestamped_url, total_seconds, youtube_id, caption, tags)
-            )
+        """Save parsed timestamped video URL to DB. Autocommits unless called inside self.transaction()."""
+        self.conn.execute(
+            self.insert_sql,
+            (timestamped_url, total_seconds, youtube_id, caption, tags)
+        )
 
 if __name__ == "__main__":
     db = VideoUrlParser()
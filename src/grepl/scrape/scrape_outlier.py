@@ -10,19 +10,114 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.common.exceptions import StaleElementReferenceException
 from selenium.webdriver.chrome.service import Service as ChromeService  # Add this import
 import os  # Already imported but ensure it's available for log path
 import tempfile, shutil, atexit
+import multiprocessing
+import queue
+import threading
+import hashlib
+import json
+import base64
+import zstandard as zstd
+from selectolax.lexbor import LexborHTMLParser
+from grepl.scrape.compression import (
+    DICT_TRAIN_SAMPLES, compress_html, dictionary_compressor, train_dictionary,
+)
+from grepl.scrape.db import SQLITE_PRAGMAS
 
 APPROX_CONTENT_HEIGHT = 900 # approximate height of a video content block. 
 # found thru trial and error
+SCROLL_CONTAINER_SELECTOR = "div[style*='overflow: auto']" # the virtualised list of video cards
+YOUTUBE_IFRAME_SELECTOR = "iframe[src*='youtube-nocookie.com/embed']"
+NEXT_BTN_XPATH = "(//button[contains(@class,'bg-green-500') and not(@disabled)])[last()]" # last enabled green button
+MUTATION_WAIT_SEC = 5 # max wait for the list to change after a scroll / page change
+SKIP_WAIT_SEC = 0.2 # the same, when skipping pages - we don't need their content
+# resources the scraper never needs to download - we only read the markup (e.g. an
+# img's src), never the images, fonts, videos or trackers themselves
+BLOCKED_URL_PATTERNS = ["*.jpg", "*.png", "*.webp", "*.woff*", "*.mp4", "*googletagmanager*", "*doubleclick*"]
+API_URL_PATTERN = "/api/" # responses captured by OutlierDbScraper(capture_api=True)
+SQLITE_MAX_VARIABLES = 999 # bound parameters per statement on older SQLite builds (newer allow 32766)
+WRITER_QUEUE_SIZE = 64 # queued writes before save_page blocks - caps the HTML held in memory
+SCHEMA_VERSION = 2 # PRAGMA user_version once create_table has run - bump when the schema changes
+STRIPPED_TAGS = ["script", "style", "svg", "link", "noscript"] # never needed by parse_outlier
+SCRAPER_PRAGMAS = (
+    # bigger pages mean shorter overflow chains for the content_blob BLOBs. Only takes
+    # effect on a new DB, so it has to come before switching to WAL
+    "PRAGMA page_size=16384",
+    *SQLITE_PRAGMAS,
+    # later pragmas win, so these override the shared settings
+    "PRAGMA cache_size=-65536",     # ~64 MB page cache
+    "PRAGMA busy_timeout=30000",    # ms - parallel scrapers take turns writing, see scrape_pages_parallel
+)
+
+# counts DOM mutations in the element matching `selector` (or the whole body) in
+# window.__newRows, see OutlierDbScraper._arm_mutation_observer. Shared with scrape_outlier_async
+ARM_OBSERVER_JS = """
+    const el = document.querySelector(selector) || document.body;
+    if (window.__observed !== el) {
+        if (window.__observer) window.__observer.disconnect();
+        window.__observer = new MutationObserver(() => window.__newRows++);
+        window.__observer.observe(el, {childList: true, subtree: true});
+        window.__observed = el;
+    }
+    window.__newRows = 0;
+"""
+
+_CONTENT_HASHER = hashlib.blake2b(digest_size=16) # .copy()'d per page rather than set up again
+
+def utc_snapshot_ts() -> str:
+    """The current time as a raw_page snapshot_ts, e.g. '2025-01-01T12:00:00+00:00'."""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+def strip_page_html(html: str) -> str:
+    """Drop STRIPPED_TAGS (and everything in them) from a page before it's stored."""
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(STRIPPED_TAGS)
+    return tree.html
 
 class OutlierDbSqlite:
-    conn = sqlite3.connect("outlierdb.sqlite")
 
-    def __init__(self):
-        self.create_table()
-        self.snapshot_ts = datetime.datetime.utcnow().isoformat()  # Default snapshot timestamp
+    def __init__(self, db_path: str = "outlierdb.sqlite"):
+        """
+        Everything after setup - save_page, flush etc. - runs on a background writer
+        thread, fed by a queue, so the scraper can carry on with the next scroll while
+        pages are compressed and committed. Call close() (or flush(wait=True)) to make
+        sure everything queued has been written.
+        """
+        # one connection per instance (and so per process, for scrape_pages_parallel).
+        # Created here but used by the writer thread, hence check_same_thread=False
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        for pragma in SCRAPER_PRAGMAS:
+            self.conn.execute(pragma)
+        (user_version,) = self.conn.execute("PRAGMA user_version").fetchone()
+        if user_version < SCHEMA_VERSION:
+            self.create_table()
+        # the raw_page unique index from an earlier session's finalize() - dropped while
+        # we insert and rebuilt by ours, see _finalize
+        with self.conn:
+            self.conn.execute("DROP INDEX IF EXISTS ux_raw_page")
+        self._buffer: list[tuple] = []  # rows waiting for flush()
+        self._blob_buffer: dict[bytes, bytes] = {}  # content_hash -> compressed html, waiting for flush()
+        self._flushed_hashes: set[bytes] = set()  # content_blob rows known to exist already
+        self._api_buffer: list[tuple] = []  # api_response rows waiting for flush()
+        # compress with the most recently trained dictionary. Without one, collect pages
+        # to train it on - see save_page
+        dict_row = self.conn.execute(
+            "SELECT dict_data FROM zstd_dict ORDER BY created_ts DESC LIMIT 1"
+        ).fetchone()
+        dict_data = zstd.ZstdCompressionDict(dict_row[0]) if dict_row else None
+        self._cctx = dictionary_compressor(dict_data)
+        self._dict_samples: list[str] | None = [] if dict_data is None else None
+        self.snapshot_ts = utc_snapshot_ts()  # Default snapshot timestamp
+        # (method, args, kwargs) for _writer_loop, None to stop. Bounded, so a slow writer
+        # slows the scraper down rather than letting pages pile up in memory
+        self._queue: queue.Queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._writer_error: Exception | None = None
+        self._writer = threading.Thread(target=self._writer_loop, name="outlierdb-writer", daemon=True)
+        self._writer.start()
 
     def create_table(self):
         with self.conn:
@@ -33,24 +128,255 @@ class OutlierDbSqlite:
                     page_idx      INTEGER,
                     scroll_idx    INTEGER,
                     snapshot_ts   TEXT,  -- ISO8601 timestamp
-                    content       TEXT,
-                    UNIQUE(url, page_idx, scroll_idx, snapshot_ts)
+                    content       BLOB,  -- legacy: inline HTML, NULL once content_hash is set
+                    content_hash  BLOB   -- content_blob.content_hash
+                    -- unique on (url, page_idx, scroll_idx, snapshot_ts), but that index only
+                    -- exists between sessions, so bulk inserts don't have to maintain it
+                )
+                """
+            )
+            # tables from before content_blob existed
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(raw_page)")}
+            if "content_hash" not in columns:
+                self.conn.execute("ALTER TABLE raw_page ADD COLUMN content_hash BLOB")
+            # successive scroll states of a page are often identical, so each distinct
+            # page is stored (and compressed) once, keyed by its hash
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS content_blob (
+                    content_hash  BLOB PRIMARY KEY,  -- blake2b-128 of the HTML
+                    content       BLOB               -- zstd-compressed HTML, see compression.py
                 )
                 """
             )
+            # raw JSON the site's API sent while a scroll state was loading
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS api_response (
+                    url           TEXT,
+                    page_idx      INTEGER,
+                    scroll_idx    INTEGER,
+                    snapshot_ts   TEXT,  -- ISO8601 timestamp
+                    request_url   TEXT,
+                    body          TEXT
+                )
+                """
+            )
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS zstd_dict (
+                    dict_id       INTEGER PRIMARY KEY,  -- as recorded in each zstd frame header
+                    dict_data     BLOB,
+                    created_ts    TEXT  -- ISO8601 timestamp of training. dict_id is derived
+                                        -- from the content, so it doesn't order them
+                )
+                """
+            )
+            # tables from before created_ts existed - their dictionaries sort as oldest
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(zstd_dict)")}
+            if "created_ts" not in columns:
+                self.conn.execute("ALTER TABLE zstd_dict ADD COLUMN created_ts TEXT")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    # ---- writer thread -----
+
+    def _writer_loop(self) -> None:
+        """
+        Run queued calls in order until the None sentinel. After a failure the rest are
+        skipped, so a page is never half written; the error is raised from the next
+        save_page, save_api_response, flush or close.
+        """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._writer_error is None:
+                    method, args, kwargs = item
+                    method(*args, **kwargs)
+            except Exception as e:
+                logging.error("OutlierDbSqlite writer failed, dropping further writes: %s", e)
+                self._writer_error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_writer_error(self) -> None:
+        if self._writer_error is not None:
+            raise RuntimeError("OutlierDbSqlite writer thread failed") from self._writer_error
+
+    # ---- public api (queued for the writer thread) -----
+
+    def save_page(self, url: str, page_idx: int, scroll_idx: int, html: str, snapshot_ts: str | None = None) -> None:
+        """Queue a single scroll state for _save_page."""
+        self._raise_writer_error()
+        self._queue.put((self._save_page, (url, page_idx, scroll_idx, html), {"snapshot_ts": snapshot_ts}))
+
+    def save_api_response(self, url: str, page_idx: int, scroll_idx: int, request_url: str, body: str,
+                          snapshot_ts: str | None = None) -> None:
+        """Queue an API response captured during a scroll state for the writer thread."""
+        self._raise_writer_error()
+        self._queue.put((self._save_api_response, (url, page_idx, scroll_idx, request_url, body),
+                         {"snapshot_ts": snapshot_ts}))
+
+    def flush(self, wait: bool = False) -> None:
+        """Queue writing everything saved so far. With wait, block until it (and all else queued) is done."""
+        self._raise_writer_error()
+        self._queue.put((self._flush, (), {}))
+        if wait:
+            self._queue.join()
+            self._raise_writer_error()
+
+    def discard(self) -> None:
+        """Queue dropping everything saved since the last flush, without writing it."""
+        self._queue.put((self._discard, (), {}))
+
+    def finalize(self) -> None:
+        """Queue building the raw_page unique index, see _finalize."""
+        self._queue.put((self._finalize, (), {}))
 
-    def save_page(self, url: str, page_idx: int, scroll_idx: int, html: str) -> None:
+    def close(self, finalize: bool = True) -> None:
+        """Flush (and finalize, by default), then stop the writer thread and close the connection."""
+        # queued directly rather than via flush(), so we still shut down after a failure
+        self._queue.put((self._flush, (), {}))
+        if finalize:
+            self.finalize()
+        self._queue.put(None)
+        self._writer.join()
+        self.conn.close()
+        self._raise_writer_error()
+
+    # ---- run on the writer thread -----
+
+    def _save_page(self, url: str, page_idx: int, scroll_idx: int, html: str, snapshot_ts: str | None = None) -> None:
+        """
+        Buffer a single scroll state. Its HTML is only compressed and buffered for
+        content_blob if we haven't stored the same HTML before. Nothing is written
+        until flush(). snapshot_ts defaults to the one taken when the DB was opened.
+        """
+        html = strip_page_html(html)
+        html_bytes = html.encode("utf-8")
+        hasher = _CONTENT_HASHER.copy()
+        hasher.update(html_bytes)
+        content_hash = hasher.digest()
+        if content_hash not in self._flushed_hashes and content_hash not in self._blob_buffer:
+            if self._dict_samples is not None:
+                self._dict_samples.append(html)
+                if len(self._dict_samples) >= DICT_TRAIN_SAMPLES:
+                    self._train_dictionary()
+            self._blob_buffer[content_hash] = compress_html(html, self._cctx)
+        self._buffer.append((url, page_idx, scroll_idx, snapshot_ts or self.snapshot_ts, content_hash))
+
+    def _save_api_response(self, url: str, page_idx: int, scroll_idx: int, request_url: str, body: str,
+                           snapshot_ts: str | None = None) -> None:
+        """Buffer an API response captured during a scroll state. Nothing is written until flush()."""
+        self._api_buffer.append((url, page_idx, scroll_idx, snapshot_ts or self.snapshot_ts, request_url, body))
+
+    def _train_dictionary(self) -> None:
+        """Train a zstd dictionary on the collected pages, store it and compress with it from now on."""
+        samples, self._dict_samples = self._dict_samples, None
+        try:
+            dict_data = train_dictionary(samples)
+        except zstd.ZstdError as e:
+            logging.warning("Could not train a zstd dictionary, compressing without one: %s", e)
+            return
         with self.conn:
             self.conn.execute(
-                "INSERT INTO raw_page (url, page_idx, scroll_idx, snapshot_ts, content) VALUES (?,?,?,?,?)",
-                (url, page_idx, scroll_idx, self.snapshot_ts, html),
+                """
+                INSERT INTO zstd_dict (dict_id, dict_data, created_ts) VALUES (?, ?, ?)
+                ON CONFLICT (dict_id) DO UPDATE SET created_ts = excluded.created_ts
+                """,
+                (dict_data.dict_id(), dict_data.as_bytes(),
+                 datetime.datetime.now(datetime.timezone.utc).isoformat()),
             )
+        self._cctx = dictionary_compressor(dict_data)
+        logging.info("Trained zstd dictionary %s on %s pages", dict_data.dict_id(), len(samples))
+
+    def _insert_rows(self, insert_sql: str, rows: list[tuple]) -> None:
+        """
+        Run insert_sql ("INSERT INTO ... VALUES ") for all rows, as multi-row VALUES
+        statements of up to SQLITE_MAX_VARIABLES bound values each. Full chunks share a
+        statement, so it's only prepared once.
+        """
+        if not rows:
+            return
+        row_placeholders = "(" + ",".join("?" * len(rows[0])) + ")"
+        chunk_size = SQLITE_MAX_VARIABLES // len(rows[0])
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            self.conn.execute(
+                insert_sql + ",".join([row_placeholders] * len(chunk)),
+                [value for row in chunk for value in row],
+            )
+
+    def _flush(self) -> None:
+        """Write all buffered scroll states with multi-row INSERTs, in one transaction."""
+        if not self._buffer and not self._api_buffer:
+            return
+        with self.conn:
+            # OR IGNORE: the same HTML may have been stored by an earlier session
+            self._insert_rows(
+                "INSERT OR IGNORE INTO content_blob (content_hash, content) VALUES ",
+                list(self._blob_buffer.items()),
+            )
+            self._insert_rows(
+                "INSERT INTO raw_page (url, page_idx, scroll_idx, snapshot_ts, content_hash) VALUES ",
+                self._buffer,
+            )
+            self._insert_rows(
+                "INSERT INTO api_response (url, page_idx, scroll_idx, snapshot_ts, request_url, body) VALUES ",
+                self._api_buffer,
+            )
+        self._flushed_hashes.update(self._blob_buffer)
+        self._blob_buffer.clear()
+        self._buffer.clear()
+        self._api_buffer.clear()
+
+    def _finalize(self) -> None:
+        """
+        Create the raw_page unique index, once scraping is done. Each session drops it
+        when it opens, so uniqueness isn't enforced while inserting and duplicate rows
+        (keeping the first) are deleted beforehand. A no-op if the index exists, e.g. the
+        implicit one of raw_page tables created with a UNIQUE constraint - those still
+        enforce it on every insert.
+        """
+        if self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = 'raw_page' "
+            "AND name IN ('ux_raw_page', 'sqlite_autoindex_raw_page_1')"
+        ).fetchone():
+            return
+        with self.conn:
+            self.conn.execute(
+                """
+                DELETE FROM raw_page WHERE rowid NOT IN (
+                    SELECT min(rowid) FROM raw_page GROUP BY url, page_idx, scroll_idx, snapshot_ts
+                )
+                """
+            )
+            self.conn.execute(
+                "CREATE UNIQUE INDEX ux_raw_page ON raw_page (url, page_idx, scroll_idx, snapshot_ts)"
+            )
+
+    def _discard(self) -> None:
+        """Drop buffered scroll states without writing them."""
+        self._blob_buffer.clear()
+        self._buffer.clear()
+        self._api_buffer.clear()
 
 
 class OutlierDbScraper:
-    def __init__(self, db: OutlierDbSqlite, headless: bool = True, pause_ms: int = 1200, start_page: int = 1):
+    def __init__(self, db: OutlierDbSqlite, headless: bool = True, pause_ms: int = 1200, start_page: int = 1,
+                 capture_api: bool = False, profile_template: str | None = None):
+        """
+        With capture_api, JSON responses from the site's API (see API_URL_PATTERN) are
+        also recorded into the api_response table, alongside the HTML of each scroll state.
+
+        profile_template is a Chrome profile directory (e.g. one we're already logged in
+        with) to copy into the fresh temp profile, so the login carries over.
+        """
         self.db = db
         self.headless = headless
+        self.capture_api = capture_api
+        self._pending_api_requests: dict[str, str] = {}  # CDP requestId -> url, until loading finishes
         self.start_page = start_page
         self._pages_left_to_skip = start_page - 1  # Adjust for zero-based index
         chrome_options = Options()
@@ -59,6 +385,10 @@ class OutlierDbScraper:
         # Store profile_dir on self for cleanup
         self.profile_dir = tempfile.mkdtemp(prefix="selenium-profile-")
         atexit.register(self._cleanup_profile_dir) # Register instance method for cleanup
+        if profile_template is not None:
+            # skip the lock files of a Chrome that may still be running on the template
+            shutil.copytree(profile_template, self.profile_dir, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns("Singleton*"))
         
         # Only use the isolated profile if running headless
         # For manual login (headless=False), use the default user profile
@@ -79,6 +409,11 @@ class OutlierDbScraper:
         # Recommended flags to avoid environment conflicts
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
+        # belt and braces with BLOCKED_URL_PATTERNS below
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        if capture_api:
+            # CDP Network.* events end up in the performance log, see _capture_api_responses
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
         
         # Setup ChromeDriver service with verbose logging
         # Log file will be created in the current working directory
@@ -98,6 +433,21 @@ class OutlierDbScraper:
             self._cleanup_profile_dir() 
             raise
 
+        # Network.enable is needed both for setBlockedURLs and for capture_api's
+        # Network.getResponseBody calls
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+        except Exception as e:
+            logging.warning("Could not enable CDP network domain, loading everything: %s", e)
+            if capture_api:
+                logging.warning("No CDP network capture either, scraping HTML only")
+                self.capture_api = False
+        else:
+            try:
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+            except Exception as e:
+                logging.warning("Could not block resources via CDP, loading everything: %s", e)
+
         self.pause_sec = pause_ms / 1000
         self.wait = WebDriverWait(self.driver, 60)
 
@@ -130,31 +480,85 @@ class OutlierDbScraper:
 
 
     # ---------- helpers -----------------------------------------------------
-    def _scroll_container(self, content_height: int | None = None) -> None:
+    def _arm_mutation_observer(self) -> None:
+        """
+        Count DOM mutations in the scroll container (or the whole body, if it can't be
+        found) from now on, for _wait_for_dom_mutation. The observer is only installed
+        again if the container element changed.
+        """
+        self.driver.execute_script("const selector = arguments[0];" + ARM_OBSERVER_JS, SCROLL_CONTAINER_SELECTOR)
+
+    def _wait_for_dom_mutation(self, timeout: float = MUTATION_WAIT_SEC, warn: bool = True) -> bool:
+        """
+        Wait until the DOM changed since _arm_mutation_observer, rather than sleeping a
+        fixed time. Returns False if nothing changed within timeout (logging a warning,
+        unless warn is False).
+        """
+        try:
+            WebDriverWait(self.driver, timeout).until(
+                lambda d: d.execute_script("return window.__newRows > 0")
+            )
+            return True
+        except Exception:
+            if warn:
+                logging.warning("No DOM changes within %ss, continuing.", timeout)
+            return False
+
+    def _scroll_container(self, content_height: int | None = None, container: WebElement | None = None,
+                          fast: bool = False) -> WebElement | None:
         """
         Scroll the virtualised list container to its bottom once.
         If the element changes in the future, tweak the CSS selector.
+
+        Pass the container returned by the previous call to skip looking it up again -
+        it's only re-resolved if it went stale. Returns None if there's no container
+        (and the window was scrolled instead). With fast, only wait SKIP_WAIT_SEC for
+        new rows to render.
         """
         if content_height is None:
             content_height = APPROX_CONTENT_HEIGHT
+        self._arm_mutation_observer()
         # First attempt: generic overflow‐auto div inside the main content area
         try:
-            
-            container = self.driver.find_element(By.CSS_SELECTOR, "div[style*='overflow: auto']")
+            if container is None:
+                container = self.driver.find_element(By.CSS_SELECTOR, SCROLL_CONTAINER_SELECTOR)
             # print("Found container, scrolling.")
             # self.driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight;", container)
             # self.driver.execute_script("arguments[0].scrollTop = arguments[0].scrollTop + (arguments[0].scrollHeight - arguments[0].scrollTop) / 2;", container)
             # self.driver.execute_script("arguments[0].scrollTop = arguments[0].scrollTop + 2000;", container)
-            self.driver.execute_script(f"arguments[0].scrollTop += {content_height};", container)
+            try:
+                self.driver.execute_script(f"arguments[0].scrollTop += {content_height};", container)
+            except StaleElementReferenceException:
+                # the list was re-rendered - look the container up again
+                container = self.driver.find_element(By.CSS_SELECTOR, SCROLL_CONTAINER_SELECTOR)
+                self.driver.execute_script(f"arguments[0].scrollTop += {content_height};", container)
         except Exception:
             logging.warning("Could not find container, attempting to scroll window.")
             self.driver.execute_script("window.scrollBy(0, 4000);")
+            container = None
 
-        # Wait for page to load new content
-        try:
-            self.wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
-        except Exception:
-            logging.warning("Page load timeout, continuing.")
+        # Wait for the list to render the newly scrolled-in rows. (document.readyState
+        # is no use here - it's "complete" from the initial load on.)
+        if fast:
+            self._wait_for_dom_mutation(SKIP_WAIT_SEC, warn=False)
+        else:
+            self._wait_for_dom_mutation()
+        return container
+
+    def _snapshot_html(self) -> str:
+        """
+        outerHTML of the scroll container - which holds every video card - rather than
+        the whole page_source, so much less is serialised and sent over WebDriver per
+        scroll. Falls back to page_source if the container can't be found.
+        """
+        html = self.driver.execute_script(
+            "const el = document.querySelector(arguments[0]); return el ? el.outerHTML : null;",
+            SCROLL_CONTAINER_SELECTOR,
+        )
+        if html is None:
+            logging.warning("Could not find container, saving the full page source.")
+            return self.driver.page_source
+        return html
 
     def manual_login(self, login_url: str = "https://outlierdb.com/login") -> None:
         """
@@ -172,7 +576,7 @@ class OutlierDbScraper:
         try:
             # Wait for iframes with YouTube URLs
             WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[src*='youtube-nocookie.com/embed']"))
+                EC.presence_of_element_located((By.CSS_SELECTOR, YOUTUBE_IFRAME_SELECTOR))
             )
             # print("YouTube iframes loaded successfully")
             return True
@@ -180,6 +584,40 @@ class OutlierDbScraper:
             logging.warning("Timeout waiting for YouTube iframes: %s", e)
             return False
 
+    def _capture_api_responses(self, url: str, page_idx: int, scroll_idx: int, snapshot_ts: str | None = None) -> None:
+        """
+        Save the API responses that finished loading since the last call, read off the
+        performance log. Bodies are only fetched once loading has finished, so requests
+        still in flight carry over to the next call.
+        """
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            params = message.get("params", {})
+            if message["method"] == "Network.responseReceived":
+                response = params["response"]
+                if API_URL_PATTERN in response["url"] and "json" in response.get("mimeType", ""):
+                    self._pending_api_requests[params["requestId"]] = response["url"]
+            elif message["method"] == "Network.loadingFinished":
+                request_url = self._pending_api_requests.pop(params["requestId"], None)
+                if request_url is None:
+                    continue
+                try:
+                    response_body = self.driver.execute_cdp_cmd(
+                        "Network.getResponseBody", {"requestId": params["requestId"]}
+                    )
+                except Exception as e:
+                    logging.warning("Could not get response body of %s: %s", request_url, e)
+                    continue
+                body = response_body["body"]
+                if response_body.get("base64Encoded"):
+                    body = base64.b64decode(body).decode("utf-8")
+                self.db.save_api_response(url, page_idx, scroll_idx, request_url, body, snapshot_ts=snapshot_ts)
+
+    def _discard_api_responses(self) -> None:
+        """Drop everything on the performance log so far, for pages we don't save."""
+        self.driver.get_log("performance")
+        self._pending_api_requests.clear()
+
     # ---------- public API ---------------------------------------------------
     def scrape_pages(self, url: str, n_scrolls: int=20, n_pages: int=5) -> None:
         """
@@ -209,19 +647,21 @@ class OutlierDbScraper:
         logging.info("Fast skipping page %s", page_idx + 1)
         
         # # Use the fast scrolling method instead of regular scrolling
+        container = None  # looked up on the first scroll, then reused
         for scroll_idx in tqdm(range(n_scrolls), total=n_scrolls, desc=f"Scrolling thru page {page_idx+1}"):
             # print(f"Scrolling {scroll_idx}")
-            self._scroll_container()
-        
-            # Wait for YouTube iframes to load
-            # time.sleep(self.pause_sec)
-            self._wait_for_youtube_iframes()
-        
+            # no waiting for YouTube iframes - we don't save skipped pages
+            container = self._scroll_container(container=container, fast=True)
+
         # One final scroll to ensure we're at the bottom
         try:
             self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
         except Exception as e:
             logging.error("Error during final scroll: %s", e)
+        # otherwise the skipped page's API responses would be saved with the next scraped
+        # page. Those of the page Next loads are still logged, as after scrape_page
+        if self.capture_api:
+            self._discard_api_responses()
         
         # next button should be visible now
         if not self.click_next_btn():
@@ -233,19 +673,30 @@ class OutlierDbScraper:
 
     def scrape_page(self, url: str, page_idx: int = 0, n_scrolls: int = 20) -> None:
         """
-        Scrape the given url, scrolling n_scrolls times.
+        Scrape the given url, scrolling n_scrolls times. All scroll states of the page
+        are buffered and saved in one flush, so a page is stored either fully or not at all.
         """
-        for scroll_idx in tqdm(range(n_scrolls), total=n_scrolls, desc=f"Scraping page {page_idx+1}"):
-            # print(f"Scrolling {scroll_idx}")
-            self._scroll_container()
-            
-            # Wait for YouTube iframes to load
-            # time.sleep(self.pause_sec)
-            self._wait_for_youtube_iframes()
-            
-            # Get page source after iframes have loaded
-            html = self.driver.page_source
-            self.db.save_page(url, page_idx, scroll_idx, html)
+        # one timestamp for all scroll states of the page
+        snapshot_ts = utc_snapshot_ts()
+        container = None  # looked up on the first scroll, then reused
+        try:
+            for scroll_idx in tqdm(range(n_scrolls), total=n_scrolls, desc=f"Scraping page {page_idx+1}"):
+                # print(f"Scrolling {scroll_idx}")
+                container = self._scroll_container(container=container)
+
+                # Wait for YouTube iframes to load
+                # time.sleep(self.pause_sec)
+                self._wait_for_youtube_iframes()
+
+                # Get the list's HTML after iframes have loaded
+                html = self._snapshot_html()
+                self.db.save_page(url, page_idx, scroll_idx, html, snapshot_ts=snapshot_ts)
+                if self.capture_api:
+                    self._capture_api_responses(url, page_idx, scroll_idx, snapshot_ts=snapshot_ts)
+        except BaseException:
+            self.db.discard()
+            raise
+        self.db.flush()
 
 
     def click_next_btn(self) -> bool:
@@ -274,11 +725,12 @@ class OutlierDbScraper:
                 
                 # wait for the last enabled green "Next" button via XPath
                 next_btn = WebDriverWait(self.driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, "(//button[contains(@class,'bg-green-500') and not(@disabled)])[last()]"))
+                    EC.element_to_be_clickable((By.XPATH, NEXT_BTN_XPATH))
                 )
+                self._arm_mutation_observer()
                 next_btn.click()
                 logging.info("Clicked Next; waiting for page load")
-                time.sleep(self.pause_sec)
+                self._wait_for_dom_mutation()
                 return True
             
             except Exception as e:
@@ -320,13 +772,46 @@ class OutlierDbScraper:
                 logging.error("Error during driver.quit(): %s", e)
         # Explicitly clean up profile dir on close, atexit is a fallback
         self._cleanup_profile_dir()
+        # make sure all scraped pages are written before we return
+        self.db.flush(wait=True)
+
+
+def _scrape_shard(url: str, start_page: int, n_pages: int, n_scrolls: int, profile_template: str | None,
+                  pause_ms: int) -> None:
+    """Scrape pages [start_page, start_page + n_pages) in this process. See scrape_pages_parallel."""
+    db = OutlierDbSqlite()
+    with OutlierDbScraper(db, headless=True, pause_ms=pause_ms, start_page=start_page,
+                          profile_template=profile_template) as scraper:
+        scraper.driver.get(url)
+        # skip_page uses up a page of scrape_pages' loop, so count the skipped ones too
+        scraper.scrape_pages(url, n_scrolls=n_scrolls, n_pages=start_page - 1 + n_pages)
+    # finalized once all workers are done, see scrape_pages_parallel
+    db.close(finalize=False)
+
+def scrape_pages_parallel(url: str, n_workers: int, pages_per_worker: int, n_scrolls: int = 20,
+                          first_page: int = 1, profile_template: str | None = None, pause_ms: int = 1200) -> None:
+    """
+    Scrape n_workers * pages_per_worker pages starting at first_page, with each worker
+    process running its own headless Chrome over a contiguous range of pages. Scraping
+    is bound by network and rendering latency rather than CPU, so this is close to
+    n_workers times faster. Workers write to the same DB, taking turns via busy_timeout.
+
+    Workers can't log in manually, so pass a logged-in profile as profile_template.
+    """
+    shards = [
+        (url, first_page + worker_idx * pages_per_worker, pages_per_worker, n_scrolls, profile_template, pause_ms)
+        for worker_idx in range(n_workers)
+    ]
+    with multiprocessing.Pool(n_workers) as pool:
+        pool.starmap(_scrape_shard, shards)
+    OutlierDbSqlite().close()  # build the raw_page index now that nobody is inserting
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     db = OutlierDbSqlite()
-    db.create_table()
     # Launch a visible browser for manual login
     with OutlierDbScraper(db, headless=False, pause_ms=1500, start_page=1) as scraper:
         scraper.manual_login()  # comment this out if we're already logged in and at the right page
         scraper.scrape_pages("https://outlierdb.com/", n_scrolls=23, n_pages=2000)
+    db.close()
@@ -0,0 +1,207 @@
+# Async Playwright version of scrape_outlier.OutlierDbScraper
+"""
+Same scroll-wait-snapshot loop as scrape_outlier.OutlierDbScraper, but on Playwright's
+async API: commands go over one persistent CDP websocket rather than a JSON-over-HTTP
+request each. Saving a scroll state (strip, hash, compress, commit) happens on
+OutlierDbSqlite's writer thread, so it overlaps with the next scroll. Handing a state
+over goes through asyncio.to_thread too: save_page blocks while the writer's queue is
+full, and that shouldn't stall the event loop.
+"""
+import asyncio
+import logging
+from playwright.async_api import async_playwright
+from tqdm import tqdm
+from grepl.scrape.scrape_outlier import (
+    APPROX_CONTENT_HEIGHT, ARM_OBSERVER_JS, MUTATION_WAIT_SEC, NEXT_BTN_XPATH, SCROLL_CONTAINER_SELECTOR,
+    SKIP_WAIT_SEC, YOUTUBE_IFRAME_SELECTOR, OutlierDbSqlite, utc_snapshot_ts,
+)
+
+# arm a MutationObserver on the scroll container, see OutlierDbScraper._arm_mutation_observer
+_ARM_OBSERVER_FN = f"(selector) => {{ {ARM_OBSERVER_JS} }}"
+# arm and scroll in a single round trip. Returns whether the container was found
+_SCROLL_JS = f"""
+([selector, contentHeight]) => {{
+    {ARM_OBSERVER_JS}
+    const container = document.querySelector(selector);
+    if (container) {{
+        container.scrollTop += contentHeight;
+    }} else {{
+        window.scrollBy(0, 4000);
+    }}
+    return container !== null;
+}}
+"""
+_OUTER_HTML_JS = "(selector) => { const el = document.querySelector(selector); return el ? el.outerHTML : null; }"
+
+
+class AsyncOutlierDbScraper:
+    def __init__(self, db: OutlierDbSqlite, headless: bool = True, pause_ms: int = 1200, start_page: int = 1):
+        self.db = db
+        self.headless = headless
+        self.pause_sec = pause_ms / 1000
+        self._pages_left_to_skip = start_page - 1  # Adjust for zero-based index
+
+    async def __aenter__(self):
+        self._playwright = await async_playwright().start()
+        self.browser = await self._playwright.chromium.launch(headless=self.headless)
+        self.page = await self.browser.new_page()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+    # ---------- helpers -----------------------------------------------------
+    async def _scroll_container(self, fast: bool = False) -> None:
+        """
+        Scroll the virtualised list container once, then wait for the newly scrolled-in
+        rows to render (only briefly, with fast).
+        """
+        found = await self.page.evaluate(_SCROLL_JS, [SCROLL_CONTAINER_SELECTOR, APPROX_CONTENT_HEIGHT])
+        if not found:
+            logging.warning("Could not find container, scrolled window instead.")
+        if fast:
+            await self._wait_for_dom_mutation(SKIP_WAIT_SEC, warn=False)
+        else:
+            await self._wait_for_dom_mutation()
+
+    async def _wait_for_dom_mutation(self, timeout: float = MUTATION_WAIT_SEC, warn: bool = True) -> bool:
+        """Wait until the DOM changed since the observer was last armed."""
+        try:
+            await self.page.wait_for_function("window.__newRows > 0", timeout=timeout * 1000)
+            return True
+        except Exception:
+            if warn:
+                logging.warning("No DOM changes within %ss, continuing.", timeout)
+            return False
+
+    async def _wait_for_youtube_iframes(self, timeout=10) -> bool:
+        try:
+            await self.page.wait_for_selector(YOUTUBE_IFRAME_SELECTOR, state="attached", timeout=timeout * 1000)
+            return True
+        except Exception as e:
+            logging.warning("Timeout waiting for YouTube iframes: %s", e)
+            return False
+
+    async def _snapshot_html(self) -> str:
+        """outerHTML of the scroll container, or the whole page if it can't be found."""
+        html = await self.page.evaluate(_OUTER_HTML_JS, SCROLL_CONTAINER_SELECTOR)
+        if html is None:
+            logging.warning("Could not find container, saving the full page source.")
+            return await self.page.content()
+        return html
+
+    # ---------- public API ---------------------------------------------------
+    async def manual_login(self, login_url: str = "https://outlierdb.com/login") -> None:
+        """
+        Open a browser window for manual login. Waits for user confirmation.
+        """
+        await self.page.goto(login_url)
+        logging.info("Please log in in the opened browser. Press Enter here to continue scraping...")
+        await asyncio.to_thread(input)
+
+    async def scrape_pages(self, url: str, n_scrolls: int = 20, n_pages: int = 5) -> None:
+        """
+        Scrape n_pages of the given url, scrolling n_scrolls times per page. Use
+        click_next_btn to navigate to the next page.
+        """
+        for page in range(n_pages):
+            if self._pages_left_to_skip > 0:
+                await self.skip_page(page, n_scrolls)
+            else:
+                await self.scrape_page(url, page, n_scrolls)
+                if not await self.click_next_btn():
+                    break
+
+    async def skip_page(self, page_idx: int, n_scrolls: int) -> None:
+        """
+        Skip a page by quickly scrolling to the bottom to reveal the Next button.
+        """
+        logging.info("Fast skipping page %s", page_idx + 1)
+        for _ in tqdm(range(n_scrolls), total=n_scrolls, desc=f"Scrolling thru page {page_idx+1}"):
+            await self._scroll_container(fast=True)
+        if not await self.click_next_btn():
+            logging.warning("Next button not found after fast scroll. Manual intervention may be needed.")
+            return
+        self._pages_left_to_skip -= 1
+        logging.info("Skipped page %s, remaining pages to skip: %s", page_idx + 1, self._pages_left_to_skip)
+
+    async def scrape_page(self, url: str, page_idx: int = 0, n_scrolls: int = 20) -> None:
+        """
+        Scrape the given url, scrolling n_scrolls times. Scroll states are handed to the
+        DB's writer thread as we go, and flushed together at the end of the page - or
+        discarded if anything failed.
+        """
+        snapshot_ts = utc_snapshot_ts()
+        try:
+            for scroll_idx in tqdm(range(n_scrolls), total=n_scrolls, desc=f"Scraping page {page_idx+1}"):
+                await self._scroll_container()
+                await self._wait_for_youtube_iframes()
+                html = await self._snapshot_html()
+                await asyncio.to_thread(self.db.save_page, url, page_idx, scroll_idx, html, snapshot_ts=snapshot_ts)
+        except BaseException:
+            await asyncio.to_thread(self.db.discard)
+            raise
+        await asyncio.to_thread(self.db.flush)
+
+    async def click_next_btn(self) -> bool:
+        """
+        Click the "Next" button to navigate to the next page.
+        If the button is not found, try and find it. After 20 attempts, ask for manual intervention.
+        """
+        max_attempts = 20
+        next_btn = self.page.locator(f"xpath={NEXT_BTN_XPATH}")
+        for attempt in range(max_attempts):
+            try:
+                await self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                if attempt > 0:
+                    logging.info("Attempt %s/%s: Trying additional scrolling...", attempt + 1, max_attempts)
+                    # Scroll up slightly and then down again (sometimes helps reveal buttons)
+                    await self.page.evaluate("window.scrollBy(0, -500)")
+                    await asyncio.sleep(self.pause_sec / 2)
+                    await self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                await next_btn.wait_for(state="visible", timeout=5000)
+                await self.page.evaluate(_ARM_OBSERVER_FN, SCROLL_CONTAINER_SELECTOR)
+                await next_btn.click(timeout=5000)
+                logging.info("Clicked Next; waiting for page load")
+                await self._wait_for_dom_mutation()
+                return True
+            except Exception as e:
+                logging.warning("Attempt %s/%s failed: %s...", attempt + 1, max_attempts, str(e)[:100])
+                if attempt < max_attempts - 1:
+                    await asyncio.sleep(self.pause_sec * 2)
+
+        if not self.headless:
+            logging.warning("MANUAL INTERVENTION NEEDED: Next button could not be found automatically.")
+            logging.warning("After navigating to the next page, press Enter to continue scraping...")
+            await asyncio.to_thread(input)
+            logging.info("Resuming automated scraping...")
+            return True
+        logging.warning("Browser is not visible (headless mode). Cannot request manual intervention.")
+        logging.info("Stopping pagination.")
+        return False
+
+    async def close(self) -> None:
+        if hasattr(self, 'browser'):
+            try:
+                await self.browser.close()
+            except Exception as e:
+                logging.error("Error during browser.close(): %s", e)
+        if hasattr(self, '_playwright'):
+            await self._playwright.stop()
+        # make sure all scraped pages are written, without blocking the event loop
+        await asyncio.to_thread(self.db.flush, wait=True)
+
+
+async def main():
+    db = OutlierDbSqlite()
+    # Launch a visible browser for manual login
+    async with AsyncOutlierDbScraper(db, headless=False, pause_ms=1500, start_page=1) as scraper:
+        await scraper.manual_login()
+        await scraper.scrape_pages("https://outlierdb.com/", n_scrolls=23, n_pages=2000)
+    db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -10,14 +10,93 @@ Example:
 
 poetry run python src/grepl/scrape/video_clip_downloader.py \
     https://www.youtube.com/watch?v=VKpxTsdnPiI&t=121s
+
+Where the time goes: fetching a clip is network-bound (HTTPS reads from YouTube's
+CDN), so downloads run on a thread pool, MAX_DOWNLOAD_WORKERS wide, with generous
+timeouts and retries (_DOWNLOAD_OPTS). Only the BW re-encode is CPU-bound. It runs
+inside each download's own ffmpeg process, so those already run in parallel, one
+per download - each ffmpeg is kept to one thread (_BW_FFMPEG_ARGS), as several
+multi-threaded encoders would just starve each other.
 """
+import atexit
+import copy
+import json
 import os
+import shutil
 import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from typing import List, Union
 import re
 from urllib.parse import urlparse, parse_qs
 from yt_dlp import YoutubeDL
 
+MAX_DOWNLOAD_WORKERS = 8 # concurrent yt-dlp downloads - they're network-bound
+MAX_CACHED_YDL_OPTS = 8 # distinct option sets to keep idle YoutubeDLs around for
+MAX_HW_ENCODE_SESSIONS = 3 # consumer GPUs cap concurrent NVENC sessions
+RAMFS_MIN_FREE = 256 * 1024 * 1024 # bytes; Docker's default /dev/shm is only 64 MB
+# preferred H.264 encoder for BW clips: NVIDIA, then Intel Quick Sync, then software
+BW_ENCODERS = [
+    ('h264_nvenc', ['-preset', 'p1', '-b:v', '200k']),
+    ('h264_qsv', ['-preset', 'veryfast', '-b:v', '200k']),
+    ('libx264', ['-preset', 'ultrafast', '-crf', '28']),
+]
+_BW_FFMPEG_ARGS = ['-threads', '1', '-vf', 'hue=s=0'] # plus one of BW_ENCODERS
+
+def _retry_sleep(n: int) -> float:
+    """Exponential backoff between yt-dlp's retries, capped at 30s."""
+    return min(2 ** n, 30)
+
+# yt-dlp options shared by every download - see download_clip for the per-clip ones
+_DOWNLOAD_OPTS = {
+    'format': 'bestvideo[height<=240]',
+    'external_downloader': 'ffmpeg',
+    # slow CDN edges are common; a timeout only needs to catch a dead connection
+    'socket_timeout': 60,      # seconds per connection attempt
+    # Retries happen inside yt-dlp, with backoff, rather than by re-running the
+    # whole download
+    'retries': 10,             # how many times to retry a failed request
+    'fragment_retries': 10,
+    'extractor_retries': 3,
+    'file_access_retries': 3,
+    'retry_sleep_functions': {'http': _retry_sleep, 'fragment': _retry_sleep, 'extractor': _retry_sleep},
+    'noprogress': True,        # do not draw progress bars (less I/O)
+    'quiet': True,
+}
+
+# json of ydl_opts -> idle YoutubeDLs built with them, least recently used first.
+# See _download_one
+_IDLE_YDLS: OrderedDict[str, list[YoutubeDL]] = OrderedDict()
+_IDLE_YDLS_LOCK = threading.Lock()
+
+
+def _find_ramfs() -> str | None:
+    """/dev/shm, if this host has one with room for a batch of in-progress clips."""
+    try:
+        if shutil.disk_usage('/dev/shm').free >= RAMFS_MIN_FREE:
+            return '/dev/shm'
+    except OSError:
+        pass
+    return None
+
+# where yt-dlp writes clips while they download, see download_clip
+_RAMFS = _find_ramfs()
+
+_ENSURED_DIRS: set[str] = set() # output dirs already created or found, see _ensure_dir
+
+# output_dir -> (its mtime_ns, names of the files in it), see _list_dir
+_DIR_LISTINGS: dict[str, tuple[int, frozenset[str]]] = {}
+
+_EMBED_RE = re.compile(r'/embed/([^&?/]+)')
+_TS_RE = re.compile(r'(?:(\d+)m)?(\d+)s?')
+# plain https://www.youtube.com/watch?v=VIDEO_ID[&t=63s] - most URLs we see. Anything
+# else goes through urlparse in parse_timestamped_url
+_FAST_URL_RE = re.compile(r'https?://(?:www\.)?youtube\.com/watch\?v=([A-Za-z0-9_-]{11})(?:&t=(\d+)s?)?')
+# one line of a newline-joined batch: either the form above, or anything else in group 3
+_FAST_URL_LINE_RE = re.compile(rf'^(?:{_FAST_URL_RE.pattern}|(.*))$', re.MULTILINE)
+
 def parse_timestamped_url(url: str) -> tuple[str, int]:
     """
     Extract video ID and start time (in seconds) from a timestamped YouTube URL.
@@ -26,26 +105,31 @@ def parse_timestamped_url(url: str) -> tuple[str, int]:
       https://www.youtube.com/watch?v=VIDEO_ID&other=params&t=1m3s
       https://youtu.be/Szj2-YS3J2o\?t\=115 TODO
     """
+    m = _FAST_URL_RE.fullmatch(url)
+    if m:
+        return m.group(1), int(m.group(2) or 0)
     parsed = urlparse(url)
     qs = parse_qs(parsed.query)
     # video ID
     video_id = None
+    v = qs.get("v")
     # support short youtu.be URLs
     if parsed.netloc.endswith("youtu.be"):
         video_id = parsed.path.lstrip("/")
-    elif "v" in qs:
-        video_id = qs["v"][0]
+    elif v:
+        video_id = v[0]
     else:
-        m = re.search(r'/embed/([^&?/]+)', url)
+        m = _EMBED_RE.search(url)
         if m:
             video_id = m.group(1)
     if not video_id:
         raise ValueError(f"Cannot parse video ID from URL: {url}")
     # timestamp
-    t = qs.get("t", [None])[0]
+    t = qs.get("t")
+    t = t[0] if t else None
     start = 0
     if t:
-        m = re.match(r'(?:(\d+)m)?(\d+)s?', t)
+        m = _TS_RE.match(t)
         if m:
             mins = m.group(1)
             secs = m.group(2)
@@ -58,14 +142,134 @@ def parse_timestamped_url(url: str) -> tuple[str, int]:
     return video_id, start
 
 
+def parse_timestamped_urls(urls: List[str]) -> list[tuple[str, int]]:
+    """
+    parse_timestamped_url for a batch of URLs, in the same order. The plain watch?v=
+    URLs are picked out by a single regex pass over the whole batch; the rest go
+    through parse_timestamped_url one by one.
+    """
+    if not urls:
+        return []
+    if any('\n' in url for url in urls):
+        return [parse_timestamped_url(url) for url in urls]
+    parsed = []
+    for m in _FAST_URL_LINE_RE.finditer('\n'.join(urls)):
+        video_id, t, other = m.groups()
+        if other is None:
+            parsed.append((video_id, int(t or 0)))
+        else:
+            parsed.append(parse_timestamped_url(other))
+    return parsed
+
+
+def _checkout_ydl(opts_key: str, ydl_opts: dict) -> YoutubeDL:
+    """An idle YoutubeDL built with ydl_opts, or a new one if there's none."""
+    with _IDLE_YDLS_LOCK:
+        idle = _IDLE_YDLS.get(opts_key)
+        if idle:
+            _IDLE_YDLS.move_to_end(opts_key)
+            return idle.pop()
+    # copy - YoutubeDL holds on to (and fills in) the params dict it's given
+    return YoutubeDL(copy.deepcopy(ydl_opts))
+
+
+def _checkin_ydl(opts_key: str, ydl: YoutubeDL) -> None:
+    """Hand a YoutubeDL back for reuse, closing those of the least recently used opts if there are too many."""
+    with _IDLE_YDLS_LOCK:
+        _IDLE_YDLS.setdefault(opts_key, []).append(ydl)
+        _IDLE_YDLS.move_to_end(opts_key)
+        evicted = []
+        while len(_IDLE_YDLS) > MAX_CACHED_YDL_OPTS:
+            evicted += _IDLE_YDLS.popitem(last=False)[1]
+    for old_ydl in evicted:
+        old_ydl.close()
+
+
+@atexit.register
+def _close_idle_ydls() -> None:
+    with _IDLE_YDLS_LOCK:
+        ydls = [ydl for idle in _IDLE_YDLS.values() for ydl in idle]
+        _IDLE_YDLS.clear()
+    for ydl in ydls:
+        ydl.close()
+
+
+def _download_one(vid: str, ydl_opts: dict) -> None:
+    """
+    Download a single video. Building a YoutubeDL
+    (extractors, cookies, HTTP opener) takes a while, so they're reused across
+    downloads - but a YoutubeDL isn't safe to share between threads, so each is
+    checked out by one download at a time.
+
+    yt-dlp's concurrent_fragment_downloads / http_chunk_size only apply to its native
+    downloader; with external_downloader ffmpeg fetches the (single-file) format itself.
+    """
+    url = f'https://www.youtube.com/watch?v={vid}'
+    # default=repr for _retry_sleep, which is the same function on every call
+    opts_key = json.dumps(ydl_opts, sort_keys=True, default=repr)
+    ydl = _checkout_ydl(opts_key, ydl_opts)
+    try:
+        ydl.download([url])
+    finally:
+        _checkin_ydl(opts_key, ydl)
+
+
+def _ensure_dir(output_dir: str) -> None:
+    """os.makedirs(output_dir), but only the first time for each output_dir."""
+    if output_dir not in _ENSURED_DIRS:
+        os.makedirs(output_dir, exist_ok=True)
+        _ENSURED_DIRS.add(output_dir)
+
+
+def _list_dir(output_dir: str) -> frozenset[str]:
+    """
+    Names of the files in output_dir, from one scandir rather than a stat per clip.
+    Reused until the directory's mtime changes, i.e. until a file is added or removed.
+    """
+    key = os.path.abspath(output_dir)
+    mtime_ns = os.stat(key).st_mtime_ns
+    cached = _DIR_LISTINGS.get(key)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    with os.scandir(key) as entries:
+        names = frozenset(entry.name for entry in entries)
+    _DIR_LISTINGS[key] = (mtime_ns, names)
+    return names
+
+
+@lru_cache(maxsize=None)
+def _bw_encoder_args() -> tuple[str, ...]:
+    """
+    ffmpeg output args for the first of BW_ENCODERS that works on this host. Being
+    listed by `ffmpeg -encoders` doesn't mean there's a GPU to drive it, so each
+    candidate is tried on a few blank frames instead - all at once, so the probe
+    takes as long as the slowest candidate rather than all of them in turn.
+    """
+    probes = []
+    for encoder, args in BW_ENCODERS[:-1]:
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', 'color=size=320x240:duration=0.1',
+            '-c:v', encoder, *args,
+            '-f', 'null', '-'
+        ]
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError: # no ffmpeg - download_clip will fail soon enough
+            break
+        probes.append((encoder, args, proc))
+    # wait for every probe, even once one has succeeded, so none is left running
+    found = [(encoder, args) for encoder, args, proc in probes if proc.wait() == 0]
+    encoder, args = found[0] if found else BW_ENCODERS[-1]
+    return ('-c:v', encoder, *args)
+
+
 def download_clip(
     video_id: Union[str, List[str]],
     start: int,
     duration: int = 60,
     output_dir: str = 'clips',
     bw: bool = False,
-    *,
-    _allow_fallback: bool = True,
 ) -> Union[str, List[str]]:
     """
     Download a clip or clips of length `duration` seconds starting at `start`, 240p max, no audio.
@@ -76,7 +280,6 @@ def download_clip(
         duration: Duration of the clip in seconds (default: 60)
         output_dir: Output directory for downloaded clips (default: 'clips')
         bw: Convert to black and white (default: False)
-        _allow_fallback: Allow falling back to individual downloads if bulk download fails (default: True)
         
     Returns:
         If a single video_id was provided: path to the downloaded clip
@@ -86,18 +289,26 @@ def download_clip(
     video_ids = [video_id] if is_single else video_id
 
     # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
+    _ensure_dir(output_dir)
 
     # -------------------------------------------------
     # Identify which clips still need to be downloaded
     # -------------------------------------------------
     existing_paths: dict[str, str] = {}
     pending_video_ids: list[str] = []
+    try:
+        existing_names = _list_dir(output_dir)
+    except FileNotFoundError: # removed since _ensure_dir last created it
+        _ENSURED_DIRS.discard(output_dir)
+        _ensure_dir(output_dir)
+        existing_names = _list_dir(output_dir)
+    # the same for every clip in the batch, so build them once rather than per video
+    name_suffix = f"_{start}_{duration}{'_bw' if bw else ''}.mp4"
+    dir_prefix = os.path.join(output_dir, '')
     for vid in video_ids:
-        final_name = f"{vid}_{start}_{duration}{'_bw' if bw else ''}.mp4"
-        final_path = os.path.join(output_dir, final_name)
-        if os.path.exists(final_path):
-            existing_paths[vid] = final_path
+        final_name = vid + name_suffix
+        if final_name in existing_names:
+            existing_paths[vid] = dir_prefix + final_name
         else:
             pending_video_ids.append(vid)
 
@@ -108,74 +319,71 @@ def download_clip(
     # -----------------------------
     # Build common yt-dlp options
     # -----------------------------
+    # In-progress (.part) clips go to RAM if we can, and are only moved in to
+    # output_dir once complete - an aborted download never touches the disk, or
+    # invalidates _list_dir's listing
+    paths = {'home': output_dir}
+    if _RAMFS is not None:
+        paths['temp'] = _RAMFS
+
+    # Keyed by where yt-dlp puts them in its ffmpeg command: "ffmpeg_i" before the
+    # input, "ffmpeg_o" before the output file (a plain list also lands there, after
+    # yt-dlp's own "-c copy"). Each clip gets its own short-lived ffmpeg, which reads
+    # the URL itself:
+    # - the input-side -ss makes it jump to the nearest keyframe with a range request,
+    #   instead of reading [0, start) first
+    # - -multiple_requests keeps one HTTP connection alive across those range requests
+    #   (the seek, and the moov atom at the end of the file). See _download_one for why
+    #   yt-dlp's own concurrent fragments don't apply here
+    # - -xerror aborts on the first broken packet rather than writing a damaged clip
+    input_args = [
+        '-nostats', '-loglevel', 'error', '-xerror', '-threads', '1',
+        '-multiple_requests', '1', '-ss', str(start),
+    ]
+    output_args = ['-t', str(duration), '-an']
     if bw:
-        # First download to a temporary colored file. We'll convert later
-        outtmpl_template = os.path.join(output_dir, f"%(id)s_{start}_{duration}.temp.mp4")
+        # Desaturate in the same ffmpeg pass that downloads the clip, rather than
+        # writing a colored temp file and re-reading it. The filter can't run under
+        # yt-dlp's "-c copy", so it needs an explicit encoder to override it - a
+        # hardware one if we have it, see _bw_encoder_args. yt-dlp also sets "-f" to the
+        # source format's container, often webm, which won't take H.264 - the last
+        # "-f" wins, so force mp4
+        output_args += [*_BW_FFMPEG_ARGS, *_bw_encoder_args(), '-f', 'mp4']
     else:
-        outtmpl_template = os.path.join(output_dir, f"%(id)s_{start}_{duration}.mp4")
-
-    args_list = ['-ss', str(start), '-t', str(duration), '-an']
+        # Trim-only: stream copy, no decode or encode. yt-dlp usually adds "-c copy"
+        # itself, but not with force_keyframes_at_cuts, so don't count on it. With
+        # the input-side -ss the clip starts at the keyframe at or before start
+        output_args += ['-c', 'copy']
     ydl_opts = {
-        'format': 'bestvideo[height<=240]',
-        'outtmpl': outtmpl_template,
-        'external_downloader': 'ffmpeg',
-        'external_downloader_args': args_list,
-        # Added below to make downloads fail fast instead of hanging forever
-        'socket_timeout': 30,      # seconds per connection attempt
-        'retries': 3,              # how many times to retry a failed fragment
-        'noprogress': True,        # do not draw progress bars (less I/O)
-        'quiet': True,
+        **_DOWNLOAD_OPTS,
+        'paths': paths,
+        'outtmpl': '%(id)s' + name_suffix,
+        'external_downloader_args': {'ffmpeg_i': input_args, 'ffmpeg_o': output_args},
     }
 
-    urls = [f'https://www.youtube.com/watch?v={vid}' for vid in pending_video_ids]
-
-    # Download all videos in a SINGLE call – this avoids yt-dlp re-initialization overhead
-    try:
-        with YoutubeDL(ydl_opts) as ydl:
-            ydl.download(urls)
-    except Exception as e:
-        # If the call contained multiple video IDs, try each one individually once.
-        if _allow_fallback and len(pending_video_ids) > 1:
-            print(f"Bulk download failed ({e}), falling back to individual downloads …")
-            # Preserve successful, already-present clips
-            paths_dict: dict[str, str | None] = existing_paths.copy()
-            for vid in pending_video_ids:
-                try:
-                    paths_dict[vid] = download_clip(
-                        vid,
-                        start,
-                        duration,
-                        output_dir,
-                        bw,
-                        _allow_fallback=False,  # avoid infinite recursion
-                    )
-                except Exception as inner_e:
-                    print(f"  – {vid} failed: {inner_e}")
-                    paths_dict[vid] = None
-            ordered_paths = [paths_dict.get(v) for v in video_ids]
-            return ordered_paths[0] if is_single else ordered_paths
-
-        # Either already attempted fallback or only a single video – propagate error
-        raise
-
-    # -----------------------------
-    # Post-processing and assemble final path list
-    # -----------------------------
+    # Download concurrently (see _download_one) - the downloads are network-bound, so
+    # threads overlap nicely. A failed video is None in the results
     paths_dict: dict[str, str | None] = existing_paths.copy()
-
-    for vid in pending_video_ids:
-        base_path = outtmpl_template.replace('%(id)s', vid)
-        if bw:
-            bw_path = base_path.replace('.temp.mp4', '_bw.mp4')
+    max_workers = min(MAX_DOWNLOAD_WORKERS, len(pending_video_ids))
+    if bw and _bw_encoder_args()[1] != 'libx264':
+        # the GPU refuses sessions past its limit, rather than queueing them
+        max_workers = min(max_workers, MAX_HW_ENCODE_SESSIONS)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_download_one, vid, ydl_opts): vid
+            for vid in pending_video_ids
+        }
+        for future in as_completed(futures):
+            vid = futures[future]
             try:
-                subprocess.run(['ffmpeg', '-y', '-i', base_path, '-vf', 'hue=s=0', bw_path], check=True)
-                os.remove(base_path)
-                paths_dict[vid] = bw_path
+                future.result()
             except Exception as e:
-                print(f"Error converting {vid} to BW: {e}")
-                paths_dict[vid] = None
-        else:
-            paths_dict[vid] = base_path
+                # A single video - propagate error
+                if is_single:
+                    raise
+                print(f"  – {vid} failed: {e}")
+                continue
+            paths_dict[vid] = dir_prefix + vid + name_suffix
 
     # Return results preserving the original order
     ordered_paths = [paths_dict.get(v) for v in video_ids]